@@ -7,6 +7,8 @@ import re
 
 # import the control agent tool 
 from .control_tools import check_child_identity
+from . import storage
+from . import compact
 
 # ---------------- SAFETY DISCLAIMER ----------------
 SAFETY_HEADER = """
@@ -17,29 +19,41 @@ If you believe your child may be experiencing a medical emergency, call your loc
 
 
 # ------------------ BOOKING HELPER FUNCTIONS ------------------
-def _load_bookings():
-    """Internal helper to load bookings.json safely."""
-    bookings_path = os.path.join(os.path.dirname(__file__), "bookings.json")
+# Bookings live in per-provider shards (see storage.py). Reads fan out over
+# only the shards a tool needs; writes lock just the one shard they change.
 
-    if not os.path.exists(bookings_path):
-        return {"bookings": []}, bookings_path
-
-    with open(bookings_path, "r") as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            data = {"bookings": []}
+def _load_bookings(provider: str = ""):
+    """
+    Internal helper to load bookings safely.
 
-    if "bookings" not in data:
-        data["bookings"] = []
+    With a provider, reads only that provider's shard; otherwise merges all shards.
+    """
+    if provider:
+        return storage.load_bookings([provider])
+    return storage.load_bookings()
 
-    return data, bookings_path
 
+def _cancel_booking(booking) -> bool:
+    """
+    Mark one booking cancelled, under its shard lock.
 
-def _save_bookings(data, bookings_path: str):
-    """Internal helper to save bookings.json."""
-    with open(bookings_path, "w") as f:
-        json.dump(data, f, indent=2)
+    The booking was found by an unlocked read, so look it up again in the
+    freshly loaded shard by (slot_start, provider, child_name) and cancel the
+    first active ("booked") match. Duplicate records are cancelled one per call.
+    Returns False if no active match is left (another session got there first).
+    """
+    provider = booking.get("provider", "")
+    key = (booking.get("slot_start"), provider, booking.get("child_name"))
+    with storage.shard_lock(provider):
+        data, shard = storage.load_shard(provider)
+        for b in data["bookings"]:
+            if b.get("status") != "booked":
+                continue
+            if (b.get("slot_start"), b.get("provider"), b.get("child_name")) == key:
+                b["status"] = "cancelled"
+                storage.save_shard(data, shard)
+                return True
+    return False
 
 
 # ------------------ TOOL FUNCTIONS ------------------
@@ -156,9 +170,13 @@ def find_available_slots(
         schedule_data = json.load(f)
 
     # Load existing bookings to avoid double-booking
-    bookings_data, _ = _load_bookings()
+    # (only the shards of the providers we are going to offer)
+    providers = [
+        p["name"] for p in schedule_data["providers"]
+        if not preferred_doctor or p["name"] == preferred_doctor
+    ]
     booked_pairs = set()  # (slot_start, provider)
-    for b in bookings_data.get("bookings", []):
+    for b in storage.load_bookings(providers):
         if b.get("status") == "cancelled":
             continue
         slot_start = b.get("slot_start")
@@ -230,13 +248,18 @@ def find_available_slots(
                     "provider": provider["name"],
                 })
 
+    if compact.ENABLED:
+        return {"slots": compact.group_slots(results)}
     return {"slots": results}
 
 def apply_clinic_rules(visit_type: str, slots_json: str):
     """
     ADK-safe: take a JSON string instead of complex types.
-    For now, simply return it as the recommended result.
+    For now, simply return it as the recommended result
+    (re-encoded compactly when compact responses are on).
     """
+    if compact.ENABLED:
+        return {"recommended_slots": compact.compact_slots_json(slots_json)}
     return {"recommended_slots_json": slots_json}
 
 
@@ -245,23 +268,6 @@ def book_appointment(slot_start: str, provider: str, child_name: str):
     Save the booking to bookings.json and return a confirmation.
     """
 
-    # Path to bookings.json in the same folder as this file
-    bookings_path = os.path.join(os.path.dirname(__file__), "bookings.json")
-
-    # If bookings.json doesn't exist or is broken, start fresh
-    if not os.path.exists(bookings_path):
-        data = {"bookings": []}
-    else:
-        with open(bookings_path, "r") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = {"bookings": []}
-
-    # Make sure there's a 'bookings' list
-    if "bookings" not in data:
-        data["bookings"] = []
-
     # Build a booking record
     booking = {
         "slot_start": slot_start,
@@ -270,12 +276,11 @@ def book_appointment(slot_start: str, provider: str, child_name: str):
         "status": "booked",
     }
 
-    # Add booking to the list
-    data["bookings"].append(booking)
-
-    # Save back to bookings.json
-    with open(bookings_path, "w") as f:
-        json.dump(data, f, indent=2)
+    # Lock only this provider's shard; other providers can book in parallel
+    with storage.shard_lock(provider):
+        data, shard = storage.load_shard(provider)
+        data["bookings"].append(booking)
+        storage.save_shard(data, shard)
 
     # Add a simple confirmation_id and return to the agent
     booking["confirmation_id"] = f"{provider}-{slot_start}"
@@ -299,7 +304,10 @@ def reschedule_appointment(
       3) Then book a new appointment at the requested time/provider.
     """
 
-    data, bookings_path = _load_bookings()
+    # A confirmation ID can point at any provider; otherwise only read the
+    # new provider's shard (the old booking must be with the same provider)
+    cid_given = bool((old_confirmation_id or "").strip())
+    bookings = _load_bookings("" if cid_given else new_provider)
 
     # Normalize inputs
     cid = (old_confirmation_id or "").strip().lower()
@@ -309,7 +317,7 @@ def reschedule_appointment(
 
     # ---- 1) Try to cancel by confirmation ID ----
     if cid:
-        for b in data.get("bookings", []):
+        for b in bookings:
             if b.get("confirmation_id", "").strip().lower() == cid:
                 booking_to_cancel = b
                 break
@@ -321,7 +329,7 @@ def reschedule_appointment(
         now = datetime.now()
         candidates = []
 
-        for b in data.get("bookings", []):
+        for b in bookings:
             if b.get("status") != "booked":
                 continue
 
@@ -358,8 +366,14 @@ def reschedule_appointment(
         }
 
     # Mark the old booking as cancelled
-    booking_to_cancel["status"] = "cancelled"
-    _save_bookings(data, bookings_path)
+    if not _cancel_booking(booking_to_cancel):
+        return {
+            "status": "not_rescheduled",
+            "message": (
+                "That appointment was changed while we were rescheduling it. "
+                "Please check the child's upcoming appointments and try again."
+            ),
+        }
 
     # Book the new appointment
     new_booking = book_appointment(
@@ -408,12 +422,13 @@ def cancel_appointment(
 
     from datetime import datetime
 
-    data, bookings_path = _load_bookings()
-
     cid = (confirmation_id or "").strip().lower()
     child_lower = (child_name or "").strip().lower()
     provider_name = (provider or "").strip()
 
+    # Only the named provider's shard, or every shard if no provider was given
+    bookings = _load_bookings(provider_name)
+
     # --- Parse requested date/time if provided ---
     req_dt = None
     req_date = None
@@ -429,7 +444,7 @@ def cancel_appointment(
 
     # ---- 1) Try by confirmation ID if provided ----
     if cid:
-        for b in data.get("bookings", []):
+        for b in bookings:
             if b.get("status") == "cancelled":
                 continue
             bid = (b.get("confirmation_id") or "").strip().lower()
@@ -438,7 +453,7 @@ def cancel_appointment(
                 break
     else:
         # ---- 2) Match by child / provider / date/time ----
-        for b in data.get("bookings", []):
+        for b in bookings:
             if b.get("status") == "cancelled":
                 continue
 
@@ -471,7 +486,9 @@ def cancel_appointment(
     bookings_for_child = []
     if child_lower:
         now = datetime.now()
-        for b in data.get("bookings", []):
+        # The child may have visits with other providers too -> fan out to all shards
+        child_bookings = _load_bookings() if provider_name else bookings
+        for b in child_bookings:
             if b.get("status") == "cancelled":
                 continue
             if child_lower not in (b.get("child_name") or "").lower():
@@ -491,6 +508,12 @@ def cancel_appointment(
                     }
                 )
 
+    # Both lists can appear in one result, so each gets half the token budget
+    if compact.ENABLED:
+        bookings_for_child = compact.group_bookings(
+            bookings_for_child, compact.TOKEN_BUDGET // 2
+        )
+
     # ---- No matches ----
     if not candidates:
         return {
@@ -510,23 +533,33 @@ def cancel_appointment(
                 "I found multiple matching appointments. "
                 "Please tell me which one to cancel."
             ),
-            "candidates": [
-                {
-                    "child_name": b.get("child_name"),
-                    "provider": b.get("provider"),
-                    "slot_start": b.get("slot_start"),
-                    "confirmation_id": b.get("confirmation_id"),
-                    "status": b.get("status"),
-                }
-                for b in candidates
-            ],
+            "candidates": (
+                compact.group_bookings(candidates, compact.TOKEN_BUDGET // 2)
+                if compact.ENABLED
+                else [
+                    {
+                        "child_name": b.get("child_name"),
+                        "provider": b.get("provider"),
+                        "slot_start": b.get("slot_start"),
+                        "confirmation_id": b.get("confirmation_id"),
+                        "status": b.get("status"),
+                    }
+                    for b in candidates
+                ]
+            ),
             "bookings_for_child": bookings_for_child,
         }
 
     # ---- Exactly one match -> cancel it ----
     booking = candidates[0]
-    booking["status"] = "cancelled"
-    _save_bookings(data, bookings_path)
+    if not _cancel_booking(booking):
+        return {
+            "status": "not_found",
+            "message": (
+                "That appointment was changed by someone else before I could cancel it."
+            ),
+            "bookings_for_child": bookings_for_child,
+        }
 
     return {
         "status": "cancelled",
@@ -548,13 +581,13 @@ def list_child_bookings(child_name: str):
     """
     from datetime import datetime
 
-    data, _ = _load_bookings()
+    bookings = _load_bookings()
     now = datetime.now()
     name_lower = child_name.strip().lower()
 
     upcoming = []
 
-    for booking in data.get("bookings", []):
+    for booking in bookings:
         # Skip cancelled
         if booking.get("status") == "cancelled":
             continue
@@ -575,6 +608,8 @@ def list_child_bookings(child_name: str):
 
         upcoming.append(booking)
 
+    if compact.ENABLED:
+        return {"bookings": compact.group_bookings(upcoming)}
     return {"bookings": upcoming}
 
 # ------------------ ROOT AGENT ------------------
@@ -666,7 +701,7 @@ LIST BOOKINGS:
 IMPORTANT:
 - NEVER reveal appointment details or booking history without full identity verification.
 - NEVER skip the check_child_identity step before viewing/canceling/rescheduling/listing.
-""",
+""" + (compact.INSTRUCTIONS if compact.ENABLED else ""),
        tools=[
         extract_appointment_details,
         find_available_slots,
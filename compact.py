@@ -0,0 +1,180 @@
+# pediacenter_agent/compact.py
+"""
+Compact, token-budgeted encoding for slot and booking lists in tool results.
+
+Tool results go straight into the model context, so the verbose form
+(one dict per row, repeating the provider name and full ISO timestamp)
+costs tokens on every call. The compact form groups rows by provider and
+date, and keeps only the time of day for each row:
+
+  verbose:  [{"start": "2026-10-21T09:00", "provider": "Dr. Majjul"},
+             {"start": "2026-10-21T09:30", "provider": "Dr. Majjul"}]
+  compact:  {"groups": {"Dr. Majjul": {"2026-10-21": ["09:00", "09:30"]}}}
+
+Bookings keep the child's name (and confirmation ID when stored):
+  {"groups": {"Dr. Majjul": {"2026-10-21": [["09:00", "Bruno Marrone"]]}}}
+
+Rows are kept soonest first until the list reaches TOKEN_BUDGET; anything
+cut is counted in "more_available" (next to "groups") so the model knows to
+narrow the search.
+
+Settings (environment):
+  PEDIACENTER_COMPACT_RESPONSES=0   turn compact mode off (verbose dicts)
+  PEDIACENTER_TOKEN_BUDGET=400      approx. tokens allowed per list
+
+Run `python -m pediacenter_agent.measure_compact` to measure bytes saved.
+"""
+import json
+import os
+
+ENABLED = os.environ.get("PEDIACENTER_COMPACT_RESPONSES", "1") != "0"
+TOKEN_BUDGET = int(os.environ.get("PEDIACENTER_TOKEN_BUDGET", "400"))
+
+# Rough size of a token in JSON text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+MORE_KEY = "more_available"
+
+# Appended to the root agent's instruction when compact mode is on
+INSTRUCTIONS = """
+COMPACT TOOL RESULTS:
+- Slot and booking lists in tool results are grouped by provider, then date:
+    slots:    {"groups": {"Dr. Majjul": {"2026-10-21": ["09:00", "09:30"]}}}
+    bookings: {"groups": {"Dr. Majjul": {"2026-10-21": [["09:00", "Bruno Marrone"]]}}}
+- Join the date and time as "YYYY-MM-DDTHH:MM" (e.g. "2026-10-21T09:00")
+  when passing a slot to book_appointment, cancel_appointment or
+  reschedule_appointment.
+- If a list has "more_available": N, there are N more results not shown.
+  Ask the parent to narrow it down (doctor, day, time of day) instead of guessing.
+"""
+
+
+def estimate_tokens(value) -> int:
+    """Approximate token count of a value once it is JSON-encoded."""
+    return -(-len(json.dumps(value, separators=(",", ":"))) // CHARS_PER_TOKEN)
+
+
+def _split(start: str):
+    """ "2026-10-21T09:00:00" -> ("2026-10-21", "09:00") """
+    date, _, clock = (start or "").partition("T")
+    return date, clock[:5]
+
+
+def _group(rows):
+    """rows: (start, provider, entry_or_None) sorted soonest first."""
+    grouped = {}
+    for start, provider, entry in rows:
+        date, clock = _split(start)
+        day = grouped.setdefault(provider or "", {}).setdefault(date, [])
+        day.append(clock if entry is None else [clock] + entry)
+    return grouped
+
+
+def _fit(rows, budget):
+    """
+    Group as many of the soonest rows as fit in the budget.
+
+    Returns {"groups": {...}}, plus MORE_KEY with the number of rows left out
+    when the list had to be cut.
+    """
+    budget = TOKEN_BUDGET if budget is None else budget
+    grouped = {"groups": _group(rows)}
+    if estimate_tokens(grouped) <= budget:
+        return grouped
+
+    def trimmed(count):
+        return {"groups": _group(rows[:count]), MORE_KEY: len(rows) - count}
+
+    # Binary search for the longest prefix that still fits
+    lo, hi = 0, len(rows)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(trimmed(mid)) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return trimmed(lo)
+
+
+def group_slots(slots, budget=None):
+    """Compact form of find_available_slots rows ({"start", "provider"})."""
+    rows = sorted(
+        ((s.get("start", ""), s.get("provider", ""), None) for s in slots),
+        key=lambda r: (r[0], r[1]),
+    )
+    return _fit(rows, budget)
+
+
+def group_bookings(bookings, budget=None):
+    """Compact form of booking rows ({"slot_start", "provider", "child_name", ...})."""
+    rows = []
+    for b in bookings:
+        entry = [b.get("child_name") or ""]
+        if b.get("confirmation_id"):
+            entry.append(b["confirmation_id"])
+        rows.append((b.get("slot_start") or "", b.get("provider") or "", entry))
+    rows.sort(key=lambda r: (r[0], r[1]))
+    return _fit(rows, budget)
+
+
+def expand_slots(grouped):
+    """Inverse of group_slots: back to [{"start", "provider"}, ...]."""
+    slots = []
+    for provider, days in grouped["groups"].items():
+        for date, times in days.items():
+            for clock in times:
+                slots.append({"start": f"{date}T{clock}", "provider": provider})
+    return slots
+
+
+def _is_grouping(value) -> bool:
+    """True for a bare {provider: {date: [times]}} slot grouping."""
+    return isinstance(value, dict) and all(
+        isinstance(days, dict) and all(isinstance(t, list) for t in days.values())
+        for days in value.values()
+    )
+
+
+def _slot_rows(value):
+    """Slot rows from any slot shape a tool returned, or None if unrecognised."""
+    if isinstance(value, list):
+        if all(isinstance(s, dict) and "start" in s for s in value):
+            return value
+        return None
+    if not isinstance(value, dict):
+        return None
+    if "slots" in value:
+        return _slot_rows(value["slots"])
+    if "groups" in value:
+        return expand_slots(value) if _is_grouping(value["groups"]) else None
+    if _is_grouping(value):
+        return expand_slots({"groups": value})
+    return None
+
+
+def compact_slots_json(slots_json: str, budget=None):
+    """
+    Compact a slots JSON string as the model passes it to apply_clinic_rules.
+
+    Accepts verbose rows, a find_available_slots result (verbose or compact),
+    or a bare compact grouping, and always returns a group_slots() dict.
+    Input that is not a slot list comes back as empty groups, with the raw
+    text under "unparsed".
+    """
+    try:
+        value = json.loads(slots_json)
+    except (TypeError, ValueError):
+        value = None
+
+    rows = _slot_rows(value)
+    if rows is None:
+        return {"groups": {}, "unparsed": slots_json}
+
+    result = group_slots(rows, budget)
+
+    # Keep the count of rows find_available_slots already left out
+    if isinstance(value, dict):
+        inner = value.get("slots", value)
+        earlier = inner.get(MORE_KEY, 0) if isinstance(inner, dict) else 0
+        if isinstance(earlier, int) and earlier > 0:
+            result[MORE_KEY] = result.get(MORE_KEY, 0) + earlier
+    return result
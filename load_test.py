@@ -0,0 +1,611 @@
+# pediacenter_agent/load_test.py
+"""
+Concurrent session load test for the PediaCenter scheduler.
+
+Drives many simulated parent conversations through the real ADK Runner and the
+real tool functions, but swaps gemini-2.5-flash for a deterministic local stub
+model that issues the same tool-call sequences the real agent would:
+
+  turn 1 (every session):  identity check -> extract -> find slots -> book
+  turn 2 (2 of 3 sessions): identity check -> list -> find slots -> reschedule
+                            identity check -> list -> cancel
+
+If a step cannot run (no open slots, no booking to change, a tool reports a
+failure) the session is aborted with a reason and does not count towards
+sessions/sec.
+
+Sessions run concurrently inside each worker process (asyncio) and across
+worker processes, all sharing one scratch copy of the booking shards.
+
+Usage (from the folder that contains pediacenter_agent/):
+  python -m pediacenter_agent.load_test --sessions 300 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import traceback
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncGenerator
+
+from google.adk.agents import Agent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from . import agent as scheduler
+from . import compact
+from . import storage
+
+APP_NAME = "pediacenter_loadtest"
+CHILD_DOB = "2019-04-15"
+
+FIRST_MESSAGES = [
+    "Hi, my {age} year old has a fever and a cough, can we come after school?",
+    "I need a well child check-up for my {age} year old, morning if possible.",
+    "My {age} yo has had a sore throat since yesterday, any time is fine.",
+    "Can I book an annual physical for my {age} year old? Any day works.",
+]
+FOLLOW_UPS = {
+    "book": None,
+    "reschedule": "Actually, can we move that appointment to a different time?",
+    "cancel": "Sorry, something came up. Please cancel that appointment.",
+}
+SCENARIOS = list(FOLLOW_UPS)
+
+# The stub ends a turn with DONE_TEXT when its plan finished, or with
+# ABORT_PREFIX + reason (e.g. "no_slots") when a step could not run.
+DONE_TEXT = "All done. Is there anything else I can help with?"
+ABORT_PREFIX = "[abort] "
+ABORT = "abort"
+
+# Status each plan's final tool returns on success
+SUCCESS_STATUS = {
+    "book_appointment": "booked",
+    "reschedule_appointment": "rescheduled",
+    "cancel_appointment": "cancelled",
+}
+
+
+# ------------------ STUB MODEL ------------------
+
+def _function_responses(contents):
+    """All (name, response) pairs from tool results in the conversation so far."""
+    found = []
+    for content in contents:
+        for part in content.parts or []:
+            if part.function_response:
+                found.append((part.function_response.name, part.function_response.response or {}))
+    return found
+
+
+def _first_user_text(contents):
+    for content in contents:
+        if content.role != "user":
+            continue
+        for part in content.parts or []:
+            if part.text:
+                return part.text
+    return ""
+
+
+def _last_user_text(contents):
+    for content in reversed(contents):
+        if content.role != "user":
+            continue
+        for part in content.parts or []:
+            if part.text:
+                return part.text
+    return ""
+
+
+def _responses_since_last_user_text(contents):
+    """Tool results the model has seen in the current user turn."""
+    for i in range(len(contents) - 1, -1, -1):
+        content = contents[i]
+        if content.role == "user" and any(p.text for p in content.parts or []):
+            return _function_responses(contents[i + 1:])
+    return _function_responses(contents)
+
+
+class StubSchedulingLlm(BaseLlm):
+    """
+    Deterministic stand-in for gemini-2.5-flash.
+
+    Reads the conversation and returns the next tool call of a scripted plan,
+    or a final text reply once the plan is done (DONE_TEXT) or cannot go on
+    (ABORT_PREFIX + reason). Slot choice is seeded by the child's name so a
+    run is reproducible for a given --sessions/--workers.
+    """
+
+    model: str = "stub-scheduler"
+    latency_ms: float = 0.0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        contents = llm_request.contents or []
+        call = self._next_call(contents)
+        if call is None:
+            part = types.Part(text=DONE_TEXT)
+        elif call[0] == ABORT:
+            part = types.Part(text=ABORT_PREFIX + call[1])
+        else:
+            name, args = call
+            part = types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+        # Rough token counts (~4 chars/token) so ADK's usage tracking has data
+        prompt_chars = sum(len(str(c.model_dump(exclude_none=True))) for c in contents)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_chars // 4,
+                candidates_token_count=len(str(part.model_dump(exclude_none=True))) // 4,
+            ),
+        )
+
+    def _next_call(self, contents):
+        """Next (tool, args), (ABORT, reason), or None once the plan succeeded."""
+        text = _last_user_text(contents)
+        match = re.search(r"Child: (\S+) (\S+)", _first_user_text(contents))
+        if not match:
+            return ABORT, "no_child"
+        first_name, last_name = match.groups()
+        child_name = f"{first_name} {last_name}"
+
+        history = _function_responses(contents)
+        turn = _responses_since_last_user_text(contents)
+        done = [name for name, _ in turn]
+        last = turn[-1][1] if turn else {}
+
+        # Every turn starts with the identity check
+        if not done:
+            return "check_child_identity", {
+                "child_first_name": first_name,
+                "child_last_name": last_name,
+                "child_dob": CHILD_DOB,
+            }
+
+        details = next((r for n, r in history if n == "extract_appointment_details"), None)
+        booking = _active_booking(history)
+        lowered = text.lower()
+
+        if "cancel" in lowered:
+            plan = ["check_child_identity", "list_child_bookings", "cancel_appointment"]
+        elif "move" in lowered:
+            plan = ["check_child_identity", "list_child_bookings",
+                    "find_available_slots", "reschedule_appointment"]
+        else:
+            plan = ["check_child_identity", "extract_appointment_details",
+                    "find_available_slots", "book_appointment"]
+
+        if len(done) >= len(plan):
+            # The plan ran; it only counts if its last tool actually succeeded
+            final = plan[-1]
+            if last.get("status") != SUCCESS_STATUS[final]:
+                return ABORT, final.split("_")[0] + "_failed"
+            return None
+        step = plan[len(done)]
+
+        if step == "extract_appointment_details":
+            return step, {"message": text}
+
+        if step == "list_child_bookings":
+            return step, {"child_name": child_name}
+
+        if step == "find_available_slots":
+            if details is None:
+                return ABORT, "no_details"
+            if "move" in lowered and booking is None:
+                return ABORT, "no_booking"
+            args = {
+                "child_age_years": details["child_age_years"],
+                "visit_type": details["visit_type"],
+                "preferred_times": details["preferred_times"],
+                "urgency": details["urgency"],
+            }
+            # Rescheduling keeps the same doctor
+            if booking:
+                args["preferred_doctor"] = booking["provider"]
+            return step, args
+
+        if step in ("book_appointment", "reschedule_appointment"):
+            slots = last.get("slots", [])
+            if isinstance(slots, dict):
+                slots = compact.expand_slots(slots)
+            if booking:
+                slots = [s for s in slots if s["start"] != booking["slot_start"]]
+            if not slots:
+                return ABORT, "no_slots"
+            slot = slots[zlib.crc32(child_name.encode()) % len(slots)]
+            if step == "book_appointment":
+                return step, {
+                    "slot_start": slot["start"],
+                    "provider": slot["provider"],
+                    "child_name": child_name,
+                }
+            return step, {
+                "old_confirmation_id": "",
+                "new_slot_start": slot["start"],
+                "new_provider": slot["provider"],
+                "child_name": child_name,
+            }
+
+        if step == "cancel_appointment":
+            if booking is None:
+                return ABORT, "no_booking"
+            return step, {
+                "child_name": child_name,
+                "provider": booking["provider"],
+                "slot_start": booking["slot_start"],
+            }
+
+        return ABORT, f"unknown_step:{step}"
+
+
+def _active_booking(history):
+    """The booking this session currently holds, according to its own tool results."""
+    booking = None
+    for name, response in history:
+        if name == "book_appointment" and response.get("status") == "booked":
+            booking = {"slot_start": response["slot_start"], "provider": response["provider"]}
+        elif name == "reschedule_appointment" and response.get("status") == "rescheduled":
+            booking = {"slot_start": response["new_slot_start"], "provider": response["new_provider"]}
+        elif name == "cancel_appointment" and response.get("status") == "cancelled":
+            booking = None
+    return booking
+
+
+# ------------------ WORKER ------------------
+
+class _WorkerStats:
+    """Tool timings and per-child outcomes collected inside one worker process."""
+
+    def __init__(self):
+        self.started = {}
+        self.tool_latencies = defaultdict(list)
+        # book/reschedule/cancel calls that did not return their success status
+        self.failed_responses = 0
+        # child_name -> set of (slot_start, provider) the session believes is booked
+        self.expected = {}
+
+    def before_tool(self, tool, args, tool_context):
+        self.started[tool_context.function_call_id] = time.perf_counter()
+        return None
+
+    def after_tool(self, tool, args, tool_context, tool_response):
+        started = self.started.pop(tool_context.function_call_id, None)
+        if started is not None:
+            self.tool_latencies[tool.name].append(time.perf_counter() - started)
+
+        status = tool_response.get("status") if isinstance(tool_response, dict) else None
+        if tool.name == "book_appointment" and status == "booked":
+            self.expected[args["child_name"]] = {(args["slot_start"], args["provider"])}
+        elif tool.name == "reschedule_appointment" and status == "rescheduled":
+            self.expected[args["child_name"]] = {(args["new_slot_start"], args["new_provider"])}
+        elif tool.name == "cancel_appointment" and status == "cancelled":
+            self.expected[args["child_name"]] = set()
+        elif tool.name in SUCCESS_STATUS:
+            self.failed_responses += 1
+        return None
+
+
+def _final_text(events):
+    """Text of the last model reply in a turn."""
+    text = ""
+    for event in events:
+        for part in (event.content.parts if event.content else None) or []:
+            if part.text:
+                text = part.text
+    return text
+
+
+async def _run_session(runner, session_service, index, worker_index):
+    """
+    Run one parent's conversation.
+
+    Returns (scenario, abort_reason, abort_turn); abort_reason is None when
+    every turn finished its plan. A session stops at its first aborted turn.
+    """
+    child_first = f"W{worker_index:02d}S{index:04d}"
+    user_id = f"parent-{child_first.lower()}"
+    session = await session_service.create_session(app_name=APP_NAME, user_id=user_id)
+
+    scenario = SCENARIOS[index % len(SCENARIOS)]
+    first = FIRST_MESSAGES[index % len(FIRST_MESSAGES)].format(age=2 + index % 10)
+    messages = [f"{first} Child: {child_first} Loadtest, DOB {CHILD_DOB}."]
+    if FOLLOW_UPS[scenario]:
+        messages.append(FOLLOW_UPS[scenario])
+
+    for turn, text in enumerate(messages):
+        new_message = types.Content(role="user", parts=[types.Part(text=text)])
+        events = [
+            event async for event in runner.run_async(
+                user_id=user_id, session_id=session.id, new_message=new_message
+            )
+        ]
+        reply = _final_text(events)
+        if reply.startswith(ABORT_PREFIX):
+            return scenario, reply[len(ABORT_PREFIX):], turn
+        if reply != DONE_TEXT:
+            return scenario, "no_reply", turn
+
+    return scenario, None, None
+
+
+async def _run_sessions(sessions, worker_index, concurrency, model_latency_ms):
+    stats = _WorkerStats()
+    model = StubSchedulingLlm(latency_ms=model_latency_ms)
+    load_agent = Agent(
+        name=scheduler.root_agent.name,
+        model=model,
+        description=scheduler.root_agent.description,
+        instruction=scheduler.root_agent.instruction,
+        tools=scheduler.root_agent.tools,
+        before_tool_callback=stats.before_tool,
+        after_tool_callback=stats.after_tool,
+    )
+    session_service = InMemorySessionService()
+    runner = Runner(agent=load_agent, app_name=APP_NAME, session_service=session_service)
+
+    limit = asyncio.Semaphore(concurrency)
+    errors = []
+    outcomes = []
+
+    async def guarded(index):
+        async with limit:
+            try:
+                outcomes.append(await _run_session(runner, session_service, index, worker_index))
+            except Exception as e:
+                # Keep what went wrong so the report can show it
+                errors.append({
+                    "error": f"{type(e).__name__}: {e}",
+                    "traceback": traceback.format_exc(),
+                })
+
+    await asyncio.gather(*(guarded(i) for i in range(sessions)))
+    return stats, errors, outcomes
+
+
+def _run_worker(worker_index, sessions, bookings_dir, concurrency, model_latency_ms):
+    """Entry point for one worker process; returns plain data for the parent."""
+    storage.BOOKINGS_DIR = bookings_dir
+    stats, errors, outcomes = asyncio.run(
+        _run_sessions(sessions, worker_index, concurrency, model_latency_ms)
+    )
+    return {
+        "sessions": sessions,
+        "errors": errors,
+        "outcomes": outcomes,
+        "tool_latencies": dict(stats.tool_latencies),
+        "failed_responses": stats.failed_responses,
+        "expected": {k: sorted(v) for k, v in stats.expected.items()},
+        "lock": dict(storage.LOCK_STATS),
+    }
+
+
+# ------------------ REPORT ------------------
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _check_bookings(bookings_dir, expected):
+    """Count double-bookings and lost updates in the final booking shards."""
+    original_dir = storage.BOOKINGS_DIR
+    storage.BOOKINGS_DIR = bookings_dir
+    try:
+        bookings = storage.load_bookings()
+    finally:
+        storage.BOOKINGS_DIR = original_dir
+
+    per_slot = defaultdict(int)
+    actual = defaultdict(set)
+    for b in bookings:
+        if b.get("status") != "booked":
+            continue
+        per_slot[(b.get("slot_start"), b.get("provider"))] += 1
+        actual[b.get("child_name")].add((b.get("slot_start"), b.get("provider")))
+
+    double_bookings = sum(count - 1 for count in per_slot.values() if count > 1)
+
+    # A lost update is a booking or cancellation a session saw succeed
+    # that is not reflected in the file at the end of the run.
+    lost_updates = 0
+    for child_name, wanted in expected.items():
+        wanted = {tuple(pair) for pair in wanted}
+        lost_updates += len(wanted ^ actual.get(child_name, set()))
+
+    return double_bookings, lost_updates
+
+
+def run_load_test(sessions=200, workers=4, concurrency=50, model_latency_ms=50.0,
+                  bookings_seed=None, keep_bookings=""):
+    """
+    Run the load test and return a summary dict.
+
+    bookings_seed: bookings folder (or legacy bookings.json) to start from
+                   (defaults to the repo's bookings/ folder).
+    keep_bookings: optional folder to copy the final booking shards to.
+    """
+    seed = bookings_seed or storage.BOOKINGS_DIR
+    workdir = tempfile.mkdtemp(prefix="pediacenter_load_")
+    bookings_dir = os.path.join(workdir, "bookings")
+    if os.path.isdir(seed):
+        shutil.copytree(seed, bookings_dir, ignore=shutil.ignore_patterns("*.lock"))
+    elif os.path.exists(seed):
+        # Legacy single file: storage splits it into shards on first use
+        shutil.copyfile(seed, bookings_dir + ".json")
+
+    # Spread sessions as evenly as possible over the workers
+    per_worker = [sessions // workers + (1 if i < sessions % workers else 0)
+                  for i in range(workers)]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_run_worker, i, n, bookings_dir, concurrency, model_latency_ms)
+            for i, n in enumerate(per_worker) if n
+        ]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+
+    latencies = defaultdict(list)
+    expected = {}
+    lock = {"acquired": 0, "contended": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+    failed = failed_responses = missing_bookings = 0
+    # "Type: message" -> {"count", "traceback" of the first occurrence}
+    errors = {}
+    scenarios = {
+        name: {"sessions": 0, "finished": 0, "aborted": defaultdict(int)}
+        for name in SCENARIOS
+    }
+    for r in results:
+        failed += len(r["errors"])
+        for e in r["errors"]:
+            row = errors.setdefault(e["error"], {"count": 0, "traceback": e["traceback"]})
+            row["count"] += 1
+        failed_responses += r["failed_responses"]
+        for scenario, reason, turn in r["outcomes"]:
+            row = scenarios[scenario]
+            row["sessions"] += 1
+            if reason is None:
+                row["finished"] += 1
+                continue
+            row["aborted"][reason] += 1
+            # Every scenario books in its first turn
+            if turn == 0:
+                missing_bookings += 1
+        expected.update(r["expected"])
+        for name, values in r["tool_latencies"].items():
+            latencies[name].extend(values)
+        lock["acquired"] += r["lock"]["acquired"]
+        lock["contended"] += r["lock"]["contended"]
+        lock["wait_seconds"] += r["lock"]["wait_seconds"]
+        lock["max_wait_seconds"] = max(lock["max_wait_seconds"], r["lock"]["max_wait_seconds"])
+
+    double_bookings, lost_updates = _check_bookings(bookings_dir, expected)
+
+    if keep_bookings:
+        shutil.copytree(bookings_dir, keep_bookings, ignore=shutil.ignore_patterns("*.lock"))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    # Only sessions that finished their whole plan count towards throughput
+    finished = sum(row["finished"] for row in scenarios.values())
+    return {
+        "sessions": sessions,
+        "completed": sessions - failed,
+        "failed": failed,
+        "errors": errors,
+        "finished_plans": finished,
+        "scenarios": {
+            name: {**row, "aborted": dict(row["aborted"])}
+            for name, row in scenarios.items()
+        },
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "sessions_per_second": round(finished / elapsed, 2) if elapsed else 0.0,
+        "tool_latency_ms": {
+            name: {
+                "calls": len(values),
+                "p50": round(_percentile(values, 50) * 1000, 3),
+                "p95": round(_percentile(values, 95) * 1000, 3),
+                "p99": round(_percentile(values, 99) * 1000, 3),
+            }
+            for name, values in sorted(latencies.items())
+        },
+        "tool_errors": failed_responses + missing_bookings,
+        "failed_responses": failed_responses,
+        "missing_bookings": missing_bookings,
+        "double_bookings": double_bookings,
+        "lost_updates": lost_updates,
+        "file_lock": {
+            "acquired": lock["acquired"],
+            "contended": lock["contended"],
+            "contention_rate": round(lock["contended"] / lock["acquired"], 3) if lock["acquired"] else 0.0,
+            "total_wait_ms": round(lock["wait_seconds"] * 1000, 3),
+            "max_wait_ms": round(lock["max_wait_seconds"] * 1000, 3),
+        },
+    }
+
+
+def _print_report(summary):
+    print(f"Sessions:        {summary['completed']}/{summary['sessions']} ran without errors "
+          f"({summary['failed']} failed) on {summary['workers']} workers")
+    for error, row in summary["errors"].items():
+        print(f"  {row['count']} x {error}")
+    if summary["errors"]:
+        first = next(iter(summary["errors"].values()))
+        print("  First traceback:")
+        print("    " + first["traceback"].rstrip().replace("\n", "\n    "))
+    print(f"Finished plans:  {summary['finished_plans']}/{summary['sessions']}")
+    print(f"Elapsed:         {summary['elapsed_seconds']} s")
+    print(f"Throughput:      {summary['sessions_per_second']} sessions/sec (finished plans only)")
+    print()
+    print(f"{'scenario':<14}{'sessions':>10}{'finished':>10}  aborted")
+    for name, row in summary["scenarios"].items():
+        aborted = ", ".join(f"{reason}={count}" for reason, count in sorted(row["aborted"].items()))
+        print(f"{name:<14}{row['sessions']:>10}{row['finished']:>10}  {aborted or '-'}")
+    print()
+    print(f"{'tool':<30}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in summary["tool_latency_ms"].items():
+        print(f"{name:<30}{row['calls']:>8}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}")
+    print()
+    print(f"Tool errors:     {summary['tool_errors']} "
+          f"({summary['failed_responses']} book/reschedule/cancel calls failed, "
+          f"{summary['missing_bookings']} sessions never booked)")
+    print(f"Double-bookings: {summary['double_bookings']}")
+    print(f"Lost updates:    {summary['lost_updates']}")
+    lock = summary["file_lock"]
+    print(f"File lock:       {lock['contended']}/{lock['acquired']} acquisitions contended "
+          f"({lock['contention_rate']:.1%}), total wait {lock['total_wait_ms']} ms, "
+          f"max wait {lock['max_wait_ms']} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent session load test for PediaCenter.")
+    parser.add_argument("--sessions", type=int, default=200, help="total simulated parents")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="max concurrent sessions per worker")
+    parser.add_argument("--model-latency-ms", type=float, default=50.0,
+                        help="simulated model think time per call")
+    parser.add_argument("--bookings-seed", default="",
+                        help="bookings folder or legacy bookings.json to start from "
+                             "(default: the repo's bookings/ folder)")
+    parser.add_argument("--keep-bookings", default="",
+                        help="copy the final booking shards to this folder for inspection")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = run_load_test(
+        sessions=args.sessions,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        model_latency_ms=args.model_latency_ms,
+        bookings_seed=args.bookings_seed or None,
+        keep_bookings=args.keep_bookings,
+    )
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        _print_report(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# pediacenter_agent/measure_compact.py
+"""
+Measure how many bytes compact tool results save.
+
+Calls the real tools with compact responses off and on and prints the size
+of each result as it would be sent to the model.
+
+Usage (from the folder that contains pediacenter_agent/):
+  python -m pediacenter_agent.measure_compact
+  PEDIACENTER_TOKEN_BUDGET=100 python -m pediacenter_agent.measure_compact
+"""
+import json
+import os
+import shutil
+import tempfile
+
+from . import agent
+from . import compact
+from . import storage
+
+
+def _size(value) -> int:
+    """Bytes of a tool result as it is sent to the model."""
+    return len(json.dumps(value).encode("utf-8"))
+
+
+def measure_payloads():
+    """
+    Call the real tools in verbose and compact mode and compare result sizes.
+
+    Uses the clinic's schedule.json and a scratch booking folder seeded with
+    a family of upcoming appointments, so the real bookings are untouched.
+    Returns a list of (label, verbose_bytes, compact_bytes).
+    """
+    original = (compact.ENABLED, storage.BOOKINGS_DIR)
+    workdir = tempfile.mkdtemp(prefix="pediacenter_compact_")
+    storage.BOOKINGS_DIR = os.path.join(workdir, "bookings")
+
+    try:
+        # Seed: two siblings with a few upcoming visits each
+        compact.ENABLED = False
+        open_slots = (
+            agent.find_available_slots(6, "well_child", "any")["slots"]
+            + agent.find_available_slots(4, "sick_visit", "any")["slots"]
+        )
+        for i, slot in enumerate(open_slots[::4][:8]):
+            child = "Bruno Marrone" if i % 2 else "Bruna Marrone"
+            agent.book_appointment(slot["start"], slot["provider"], child)
+
+        calls = [
+            ("find_available_slots well_child/any",
+             lambda: agent.find_available_slots(6, "well_child", "any")),
+            ("find_available_slots sick_visit/routine",
+             lambda: agent.find_available_slots(4, "sick_visit", "any")),
+            ("find_available_slots sick_visit/urgent",
+             lambda: agent.find_available_slots(4, "sick_visit", "any", urgency="urgent")),
+            ("find_available_slots well_child/doctor",
+             lambda: agent.find_available_slots(6, "well_child", "morning", "Dr. Majjul")),
+            ("apply_clinic_rules well_child",
+             lambda: agent.apply_clinic_rules(
+                 "well_child",
+                 json.dumps(agent.find_available_slots(6, "well_child", "any")),
+             )),
+            ("list_child_bookings bru",
+             lambda: agent.list_child_bookings("bru")),
+            ("cancel_appointment ambiguous",
+             lambda: agent.cancel_appointment(child_name="marrone")),
+        ]
+
+        results = []
+        for label, call in calls:
+            compact.ENABLED = False
+            verbose = _size(call())
+            compact.ENABLED = True
+            compact_bytes = _size(call())
+            results.append((label, verbose, compact_bytes))
+        return results
+    finally:
+        compact.ENABLED, storage.BOOKINGS_DIR = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    results = measure_payloads()
+    print(f"Token budget per list: {compact.TOKEN_BUDGET} (cancel_appointment: half per list)")
+    print(f"{'tool call':<42}{'verbose B':>11}{'compact B':>11}{'saved':>8}")
+    for label, verbose, compact_bytes in results:
+        print(f"{label:<42}{verbose:>11}{compact_bytes:>11}{1 - compact_bytes / verbose:>8.0%}")
+
+    total_verbose = sum(r[1] for r in results)
+    total_compact = sum(r[2] for r in results)
+    print(f"{'total':<42}{total_verbose:>11}{total_compact:>11}"
+          f"{1 - total_compact / total_verbose:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
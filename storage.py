@@ -0,0 +1,219 @@
+# pediacenter_agent/storage.py
+"""
+Provider-sharded booking storage.
+
+Bookings are stored one JSON file per provider, grouped by clinic location:
+
+  bookings/<location>/<provider>.json     e.g. bookings/main/dr-majjul.json
+
+Each shard has the same shape the old single bookings.json had
+({"bookings": [...]}) and its own lock file, so writes for different
+providers never wait on each other, even across worker processes.
+
+A provider's location comes from its "location" field in schedule.json
+(DEFAULT_LOCATION if missing). A legacy bookings.json next to the shard
+folder is split into shards the first time storage is used.
+"""
+import json
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from glob import glob
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks
+    fcntl = None
+
+# Folder holding the shards; load_test.py points this at a scratch copy.
+BOOKINGS_DIR = os.path.join(os.path.dirname(__file__), "bookings")
+SCHEDULE_PATH = os.path.join(os.path.dirname(__file__), "schedule.json")
+
+DEFAULT_LOCATION = "main"
+
+# Per-process counters for the shard file locks (reported by load_test.py)
+LOCK_STATS = {
+    "acquired": 0,
+    "contended": 0,
+    "wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+}
+
+_migrated_dirs = set()
+
+
+# ------------------ ROUTING ------------------
+
+def _slug(name: str) -> str:
+    """Filesystem-safe shard name, e.g. "Dr. Majjul" -> "dr-majjul"."""
+    return re.sub(r"[^a-z0-9]+", "-", (name or "").lower()).strip("-") or "unassigned"
+
+
+@lru_cache(maxsize=1)
+def provider_locations():
+    """Map provider name -> clinic location, read once from schedule.json."""
+    with open(SCHEDULE_PATH, "r") as f:
+        schedule_data = json.load(f)
+
+    return {
+        p["name"]: p.get("location", DEFAULT_LOCATION)
+        for p in schedule_data.get("providers", [])
+    }
+
+
+def shard_path(provider: str) -> str:
+    """Path of the shard file that holds this provider's bookings."""
+    location = provider_locations().get(provider, DEFAULT_LOCATION)
+    return os.path.join(BOOKINGS_DIR, _slug(location), _slug(provider) + ".json")
+
+
+def all_shard_paths():
+    """Every shard file that currently exists, across all locations."""
+    _ensure_migrated()
+    return sorted(glob(os.path.join(BOOKINGS_DIR, "*", "*.json")))
+
+
+# ------------------ SHARD I/O ------------------
+
+def _read(path: str):
+    if not os.path.exists(path):
+        return {"bookings": []}
+
+    with open(path, "r") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            data = {"bookings": []}
+
+    if "bookings" not in data:
+        data["bookings"] = []
+
+    return data
+
+
+def load_shard(provider: str):
+    """Load one provider's shard. Returns (data, path) like the old _load_bookings."""
+    _ensure_migrated()
+    path = shard_path(provider)
+    return _read(path), path
+
+
+def save_shard(data, path: str):
+    """
+    Save a shard.
+
+    Writes to a temp file and swaps it in, so readers never see a half-written file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_bookings(providers=None):
+    """
+    Fan out over shards and merge their bookings into one list.
+
+    Shards are small local files, so they are read in a plain loop; a thread
+    pool costs more to start than the reads themselves.
+
+    providers: only read these providers' shards (None -> every shard).
+    """
+    if providers is None:
+        paths = all_shard_paths()
+    else:
+        _ensure_migrated()
+        paths = sorted({shard_path(p) for p in providers})
+
+    merged = []
+    for path in paths:
+        merged.extend(_read(path)["bookings"])
+    return merged
+
+
+# ------------------ LOCKING ------------------
+
+@contextmanager
+def _file_lock(lock_path: str):
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        wait = 0.0
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Someone else is writing -> wait for them and record how long
+            LOCK_STATS["contended"] += 1
+            started = time.perf_counter()
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            wait = time.perf_counter() - started
+
+        LOCK_STATS["acquired"] += 1
+        LOCK_STATS["wait_seconds"] += wait
+        LOCK_STATS["max_wait_seconds"] = max(LOCK_STATS["max_wait_seconds"], wait)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def shard_lock(provider: str):
+    """
+    Hold an exclusive lock on one provider's shard for a read-modify-write.
+
+    Uses a sidecar "<shard>.lock" file so the lock survives the atomic
+    replace done by save_shard. Only ever hold one shard lock at a time.
+    """
+    _ensure_migrated()
+    with _file_lock(shard_path(provider) + ".lock"):
+        yield
+
+
+# ------------------ LEGACY MIGRATION ------------------
+
+def _record_key(booking) -> str:
+    return json.dumps(booking, sort_keys=True)
+
+
+def _ensure_migrated():
+    """
+    Split a legacy single bookings.json into provider shards (once per folder).
+
+    Safe to re-run after a crash part-way through: a legacy record is only
+    added to a shard as many times as it is still missing there, so shards
+    that were already written are not filled twice.
+    """
+    if BOOKINGS_DIR in _migrated_dirs:
+        return
+
+    legacy_path = BOOKINGS_DIR + ".json"
+    if os.path.exists(legacy_path):
+        with _file_lock(legacy_path + ".lock"):
+            # Another process may have finished the migration while we waited
+            if os.path.exists(legacy_path):
+                by_shard = {}
+                for b in _read(legacy_path)["bookings"]:
+                    by_shard.setdefault(shard_path(b.get("provider", "")), []).append(b)
+
+                for path, bookings in by_shard.items():
+                    data = _read(path)
+                    present = Counter(_record_key(x) for x in data["bookings"])
+                    for booking in bookings:
+                        key = _record_key(booking)
+                        if present[key]:
+                            present[key] -= 1
+                            continue
+                        data["bookings"].append(booking)
+                    save_shard(data, path)
+
+                os.replace(legacy_path, legacy_path + ".migrated")
+
+    _migrated_dirs.add(BOOKINGS_DIR)